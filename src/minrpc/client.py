@@ -4,9 +4,14 @@ RPC client utilities.
 
 from __future__ import absolute_import
 
+import atexit
+import collections
 import sys
+import threading
+import weakref
 
 from . import ipc
+from .dispatch import get_handlers
 
 
 __all__ = [
@@ -36,6 +41,119 @@ class RemoteProcessCrashed(RuntimeError):
     pass
 
 
+class Pipeline(object):
+
+    """
+    Keep multiple requests in flight on a connection.
+
+    Requests can be sent from multiple threads without waiting for the
+    responses to previous requests. The service answers requests strictly
+    in order, so a background thread can simply hand out the responses to
+    the waiting requests in FIFO order.
+    """
+
+    def __init__(self, conn, max_in_flight):
+        """Start receiving responses on the given connection."""
+        self._conn = conn
+        self._slots = threading.Semaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self._pending = collections.deque()
+        self._error = None
+        self._closing = False
+        # The thread must not keep a reference to the client, otherwise
+        # the client would never be garbage collected:
+        self._reader = threading.Thread(target=self._receive)
+        self._reader.daemon = True
+        self._reader.start()
+
+    def communicate(self, message):
+        """Transmit one message and wait for the answer."""
+        with self._slots:
+            reply = _Reply()
+            with self._lock:
+                if self._error is not None:
+                    raise self._error
+                self._pending.append(reply)
+                self._conn.send(message)
+            return reply.wait()
+
+    def send(self, message):
+        """Transmit one message without waiting for an answer."""
+        with self._lock:
+            self._conn.send(message)
+
+    def close(self, timeout=None):
+        """
+        Close the connection once the remote end has ended the stream.
+
+        The receiving file must not be closed while the background thread
+        is blocked reading from it: python2 raises an IOError, python3 waits
+        for the read to complete. If the thread doesn't finish within
+        ``timeout`` seconds, it closes the connection itself when it exits.
+        """
+        self._closing = True
+        self._reader.join(timeout)
+        if not self._reader.is_alive():
+            self._conn.close()
+
+    def _receive(self):
+        """Receive responses until the connection is closed."""
+        try:
+            while True:
+                response = self._conn.recv()
+                with self._lock:
+                    reply = self._pending.popleft()
+                reply.set(response)
+        except Exception as e:
+            with self._lock:
+                self._error = e
+                pending, self._pending = self._pending, collections.deque()
+            for reply in pending:
+                reply.set(None, e)
+            if self._closing:
+                self._conn.close()
+
+
+class _Reply(object):
+
+    """Placeholder for the response to a request in a :class:`Pipeline`."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._response = None
+        self._error = None
+
+    def set(self, response, error=None):
+        """Store the response (or error) and wake up the waiting thread."""
+        self._response = response
+        self._error = error
+        self._event.set()
+
+    def wait(self):
+        """Wait for the response and return it."""
+        self._event.wait()
+        if self._error is not None:
+            raise self._error
+        return self._response
+
+
+# Pipelined clients that are still alive at exit must be closed by an atexit
+# hook: it runs before daemon threads are frozen, whereas __del__ may only run
+# during finalization, when the reader thread is stuck holding the lock of
+# the receiving file:
+_pipelined_clients = weakref.WeakSet()
+
+
+@atexit.register
+def _close_pipelined_clients():
+    for client in list(_pipelined_clients):
+        try:
+            client.close()
+        except (RemoteProcessCrashed, RemoteProcessClosed,
+                IOError, EOFError, OSError, ValueError):
+            pass
+
+
 class Client(object):
 
     """
@@ -44,16 +162,29 @@ class Client(object):
     Uses a connection that shares the interface with :class:`Connection` to
     do synchronous RPC. Synchronous IO means that currently callbacks /
     events are impossible.
+
+    By default, each request waits for its response before the next one can
+    be sent. With ``max_in_flight > 1``, up to this many requests from
+    different threads can be outstanding at the same time (see
+    :class:`Pipeline`). In this case, ``lock`` should not be passed, since
+    it serializes all requests.
     """
 
     module = 'minrpc.service'
 
-    def __init__(self, conn, lock=None, proc=None):
+    # seconds to wait for the pipeline to finish when closing:
+    close_timeout = 5
+
+    def __init__(self, conn, lock=None, proc=None, max_in_flight=1):
         """Initialize the client with a :class:`Connection` like object."""
         self._conn = conn
         self._good = True
         self._lock = lock or NoLock()
         self._proc = proc
+        self._pipeline = None
+        if max_in_flight > 1:
+            self._pipeline = Pipeline(conn, max_in_flight)
+            _pipelined_clients.add(self)
 
     def __del__(self):
         """Close the client and the associated connection with it."""
@@ -71,7 +202,7 @@ class Client(object):
     good = property(__bool__)
 
     @classmethod
-    def spawn_subprocess(cls, lock=None, **Popen_args):
+    def spawn_subprocess(cls, lock=None, max_in_flight=1, **Popen_args):
         """
         Create client for a backend service in a subprocess.
 
@@ -81,13 +212,22 @@ class Client(object):
         """
         args = [sys.executable, '-m', cls.module]
         conn, proc = ipc.spawn_subprocess(args, **Popen_args)
-        return cls(conn, lock=lock, proc=proc), proc
+        client = cls(conn, lock=lock, proc=proc, max_in_flight=max_in_flight)
+        return client, proc
 
     def close(self):
         """Close the connection gracefully, stop the remote service."""
         if self.good:
-            self._conn.send(('close', ()))
-        self._conn.close()
+            if self._pipeline is not None:
+                self._pipeline.send(('close', ()))
+            else:
+                self._conn.send(('close', ()))
+        if self._pipeline is not None:
+            # after the 'close' request, the service ends the stream, so the
+            # reader thread should exit soon:
+            self._pipeline.close(self.close_timeout)
+        else:
+            self._conn.close()
         if self._proc:
             self._proc.wait()
 
@@ -111,16 +251,29 @@ class Client(object):
                 raise RemoteProcessCrashed()
         return self._dispatch(response)
 
+    def _request_many(self, calls):
+        """
+        Perform multiple requests with a single round-trip.
+
+        ``calls`` is a list of ``(kind, args)`` tuples. Return the list of
+        results. The remote service executes all calls in any case, but if
+        some of them failed, the exception of the first failed call is
+        raised here.
+        """
+        return [self._dispatch(response)
+                for response in self._request('batch', calls)]
+
     def _communicate(self, message):
         """Transmit one message and wait for the answer."""
+        if self._pipeline is not None:
+            return self._pipeline.communicate(message)
         self._conn.send(message)
         return self._conn.recv()
 
     def _dispatch(self, response):
         """Dispatch an answer from the remote service."""
         kind, args = response
-        handler = getattr(self, '_dispatch_%s' % (kind,))
-        return handler(*args)
+        return get_handlers(type(self))[kind](self, *args)
 
     def _dispatch_exception(self, exc_type, message):
         """Dispatch an exception."""
@@ -155,7 +308,69 @@ class RemoteModule(object):
 
     def __getattr__(self, funcname):
         """Resolve all attribute accesses as remote function calls."""
+        # The method is cached in the instance dict, so that __getattr__ is
+        # invoked only on the first access. It must not refer to `self`,
+        # which would create a reference cycle:
+        request = self.__client._request
+        module = self.__module
+
         def DeferredMethod(*args, **kwargs):
-            return self.__client._request('function_call', self.__module,
-                                          funcname, args, kwargs)
+            return request('function_call', module, funcname, args, kwargs)
+        self.__dict__[funcname] = DeferredMethod
         return DeferredMethod
+
+    def batch(self):
+        """
+        Collect function calls to be executed with a single request.
+
+        Use as context manager, the calls are sent when leaving the
+        ``with`` block and the results are available afterwards::
+
+            with module.batch() as batch:
+                batch.foo(1)
+                batch.bar(2, x=3)
+            foo, bar = batch.results
+
+        Note that this method hides a remote function named ``batch``. Such
+        a function can only be called via ``Client._request``.
+        """
+        return RemoteBatch(self.__client, self.__module)
+
+
+class RemoteBatch(object):
+
+    """
+    Deferred function calls on a module in a remote process.
+
+    Note that the names ``flush`` and ``results`` refer to the batch itself,
+    remote functions with these names can't be deferred using attribute
+    access.
+    """
+
+    def __init__(self, client, module):
+        """Store the client connection."""
+        self.__client = client
+        self.__module = module
+        self.__calls = []
+        self.results = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        """Send all collected calls, unless the block raised an exception."""
+        if exc_info[0] is None:
+            self.flush()
+
+    def __getattr__(self, funcname):
+        """Resolve all attribute accesses as deferred function calls."""
+        def DeferredMethod(*args, **kwargs):
+            self.__calls.append(('function_call', (
+                self.__module, funcname, args, kwargs)))
+        return DeferredMethod
+
+    def flush(self):
+        """Execute all collected calls and store their results."""
+        calls, self.__calls = self.__calls, []
+        self.results = self.__client._request_many(calls)
+        return self.results
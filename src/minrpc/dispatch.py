@@ -0,0 +1,34 @@
+"""
+Message dispatch utilities.
+"""
+
+from __future__ import absolute_import
+
+
+__all__ = [
+    'get_handlers',
+]
+
+
+_handlers = {}
+
+
+def get_handlers(cls, prefix='_dispatch_'):
+    """
+    Return a dict that maps message kinds to handler functions.
+
+    The handlers are all methods of ``cls`` whose name starts with
+    ``prefix``, e.g. ``_dispatch_data`` handles messages of kind ``'data'``.
+    The result is computed once per class, which saves building the method
+    name and looking it up on every message.
+    """
+    try:
+        return _handlers[cls, prefix]
+    except KeyError:
+        pass
+    handlers = _handlers[cls, prefix] = {
+        name[len(prefix):]: getattr(cls, name)
+        for name in dir(cls)
+        if name.startswith(prefix)
+    }
+    return handlers
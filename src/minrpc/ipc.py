@@ -40,10 +40,6 @@ if win and py2:
         return [int(Handle.from_fd(f.fileno(), own=False))
                 for f in file_monitor.File._instances if not f.closed]
 
-else:
-    def _get_open_file_handles():
-        return []
-
 
 def get_max_fd():
     """Return the maximum possible file descriptor or a wild guess."""
@@ -58,27 +54,71 @@ def get_max_fd():
         return 4096
 
 
+def get_open_fds():
+    """
+    Return the list of open file descriptors, or ``None`` if the platform
+    provides no way to list them.
+    """
+    if sys.platform.startswith('linux'):
+        fd_dir = '/proc/self/fd'
+    elif sys.platform == 'darwin':
+        fd_dir = '/dev/fd'
+    else:
+        return None
+    try:
+        return [int(name) for name in os.listdir(fd_dir)]
+    except OSError:
+        return None
+
+
 def close_all_but(keep):
-    """Close all but the given file descriptors."""
-    # first, let the garbage collector run, it may find some unreachable
-    # file objects (on posix forked processes) and close them:
-    import gc
-    gc.collect()
-    # close all ranges in between the file descriptors to be kept:
-    keep = sorted(set([-1] + keep + [get_max_fd()]))
+    """
+    Close all but the given file descriptors.
+
+    A full garbage collection before closing the file descriptors can be
+    requested by setting the ``MINRPC_GC_BEFORE_CLOSE`` environment variable
+    to a value other than ``''`` or ``'0'``. This may be needed if
+    unreachable file objects with finalizers might be lingering, which could
+    otherwise later close a reused file descriptor.
+    """
+    # The collection can take a long time in large processes, and in our
+    # subprocesses (started by exec) there is usually nothing to collect:
+    if os.environ.get('MINRPC_GC_BEFORE_CLOSE', '') not in ('', '0'):
+        import gc
+        gc.collect()
+    # close all ranges in between the file descriptors to be kept. If the
+    # open file descriptors can be listed, there is no need to go beyond the
+    # highest one, i.e. up to the (possibly huge) limit. On linux, python
+    # 3.10+ implements each os.closerange with a single close_range syscall:
+    open_fds = get_open_fds()
+    max_fd = max(open_fds) + 1 if open_fds else get_max_fd()
+    keep = sorted(set([-1] + keep + [max_fd]))
     for s, e in zip(keep[:-1], keep[1:]):
         if s+1 < e:
             os.closerange(s+1, e)
 
 
+def get_pipe_size():
+    """
+    Return the requested size of the IPC pipe buffers in bytes.
+
+    The default buffers (64 KiB on linux) are small compared to typical
+    results, which makes the sender block until the other side has drained
+    the pipe. The size can be configured using the ``MINRPC_PIPE_SIZE``
+    environment variable, where ``0`` means to keep the system default.
+    """
+    return int(os.environ.get('MINRPC_PIPE_SIZE', 1 << 20))
+
+
 def create_ipc_connection():
     """
     Create a connection that can be used for IPC with a subprocess.
 
     Return (local_connection, remote_recv_handle, remote_send_handle).
     """
-    local_recv, _remote_send = Handle.pipe()
-    _remote_recv, local_send = Handle.pipe()
+    size = get_pipe_size()
+    local_recv, _remote_send = Handle.pipe(size)
+    _remote_recv, local_send = Handle.pipe(size)
     remote_recv = _remote_recv.dup_inheritable()
     remote_send = _remote_send.dup_inheritable()
     conn = Connection.from_fd(local_recv.detach_fd(),
@@ -104,11 +144,20 @@ def spawn_subprocess(argv, **Popen_args):
             # simply not specified (`None`)?
             if Popen_args.get(stream) is False:
                 Popen_args[stream] = devnull
-        proc = subprocess.Popen(args, close_fds=False, **Popen_args)
-    conn.send(_get_open_file_handles())
-    # wait for subprocess to confirm that all handles are closed:
-    if conn.recv() != 'ready':
-        raise RuntimeError
+        if win or py2:
+            # the IPC handles can only be passed by inheriting all handles:
+            proc = subprocess.Popen(args, close_fds=False, **Popen_args)
+        else:
+            # let subprocess close all other file descriptors in the child
+            # before exec, which is done efficiently in C:
+            pass_fds = (int(remote_recv), int(remote_send))
+            proc = subprocess.Popen(args, close_fds=True, pass_fds=pass_fds,
+                                    **Popen_args)
+    if win and py2:
+        conn.send(_get_open_file_handles())
+        # wait for subprocess to confirm that all handles are closed:
+        if conn.recv() != 'ready':
+            raise RuntimeError
     return conn, proc
 
 
@@ -129,8 +178,10 @@ def prepare_subprocess_ipc(args):
     # On python2/windows open() creates a non-inheritable file descriptor with
     # an underlying inheritable file HANDLE. Since HANDLEs can't be closed
     # with os.closerange, the following snippet is needed to prevent them from
-    # staying open in the remote process:
-    for handle in conn.recv():
-        Handle(handle).close()
-    conn.send('ready')
+    # staying open in the remote process. Elsewhere, there is nothing to do
+    # and we can save the round-trip:
+    if win and py2:
+        for handle in conn.recv():
+            Handle(handle).close()
+        conn.send('ready')
     return conn
@@ -5,6 +5,7 @@ Linux specific low level stuff.
 from __future__ import absolute_import
 
 import os
+import sys
 
 
 __all__ = [
@@ -21,6 +22,24 @@ except AttributeError:
         pass
 
 
+if sys.platform.startswith('linux'):
+    import fcntl
+    # exposed by the fcntl module only since python 3.10:
+    _F_SETPIPE_SZ = getattr(fcntl, 'F_SETPIPE_SZ', 1031)
+
+    def _set_pipe_size(fd, size):
+        # Unprivileged processes can't exceed /proc/sys/fs/pipe-max-size,
+        # in that case just keep the default size:
+        try:
+            fcntl.fcntl(fd, _F_SETPIPE_SZ, size)
+        except (IOError, OSError):
+            pass
+
+else:
+    def _set_pipe_size(fd, size):
+        pass
+
+
 class Handle(object):
 
     """
@@ -40,13 +59,18 @@ class Handle(object):
         return cls(fd, own)
 
     @classmethod
-    def pipe(cls):
+    def pipe(cls, size=0):
         """
         Create a unidirectional pipe.
 
+        If ``size`` is given, try to resize the pipe buffer to this number of
+        bytes (only supported on linux).
+
         Return a pair (recv, send) of :class:`Handle`s.
         """
         recv, send = os.pipe()
+        if size:
+            _set_pipe_size(send, size)
         return cls(recv), cls(send)
 
     def __int__(self):
@@ -7,8 +7,16 @@ from __future__ import absolute_import
 import logging
 import traceback
 import sys
+from collections import OrderedDict
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
 
 from . import ipc
+from .connection import dumps, loads
+from .dispatch import get_handlers
 
 
 __all__ = [
@@ -16,17 +24,45 @@ __all__ = [
 ]
 
 
+class PreEncoded(object):
+
+    """The already pickled response for a return value."""
+
+    def __init__(self, data):
+        """Pickle the response for the given return value."""
+        buffers = []
+        self.payload = dumps(('data', (data,)), buffers)
+        self.buffers = [buf.raw() for buf in buffers]
+
+    def decode(self):
+        """Unpickle the return value."""
+        return loads(self.payload, self.buffers)[1][0]
+
+
 class Service(object):
 
     """
     Base class for a very lightweight synchronous RPC service.
 
     Counterpart to :class:`Client`.
+
+    Subclasses can list deterministic functions as ``(modname, funcname)``
+    pairs in ``_pure_functions``. Their pickled responses are kept in a
+    cache of the ``_response_cache_size`` most recently used calls, so that
+    repeated calls with the same arguments are answered without calling the
+    function or pickling the result. The arguments are compared in pickled
+    form, which keeps their exact types at every level; calls with arguments
+    that can't be pickled are not cached.
     """
 
+    _pure_functions = frozenset()
+    _response_cache_size = 256
+
     def __init__(self, conn):
         """Initialize the service with a :class:`Connection` like object."""
         self._conn = conn
+        self._modules = {}
+        self._responses = OrderedDict()
 
     @classmethod
     def stdio_main(cls, args):
@@ -80,9 +116,9 @@ class Service(object):
         :returns: ``True`` if the service should continue running.
         """
         kind, args = request
-        handler = getattr(self, '_dispatch_%s' % (kind,))
+        handler = get_handlers(type(self))[kind]
         try:
-            response = handler(*args)
+            response = handler(self, *args)
         except Exception:
             self._reply_exception(sys.exc_info())
         else:
@@ -96,11 +132,60 @@ class Service(object):
 
     def _dispatch_function_call(self, modname, funcname, args, kwargs):
         """Execute any static function call in the remote process."""
-        # As soon as we drop support for python2.6, we should replace this
-        # with importlib.import_module:
-        module = __import__(modname, None, None, '*')
-        function = getattr(module, funcname)
-        return function(*args, **kwargs)
+        function = self._get_function(modname, funcname)
+        if (modname, funcname) not in self._pure_functions:
+            return function(*args, **kwargs)
+        # Use the pickled arguments as key, since e.g. 1, 1.0 and True are
+        # equal and hash the same (also inside containers), but functions may
+        # return different results for them:
+        try:
+            key = pickle.dumps(
+                (modname, funcname, args, sorted(kwargs.items())), -1)
+        except Exception:
+            return function(*args, **kwargs)
+        try:
+            response = self._responses.pop(key)
+        except KeyError:
+            response = PreEncoded(function(*args, **kwargs))
+        # (re-)insert as most recently used entry:
+        self._responses[key] = response
+        if len(self._responses) > self._response_cache_size:
+            self._responses.popitem(last=False)
+        return response
+
+    def _get_function(self, modname, funcname):
+        """
+        Return a module level function.
+
+        The module lookup is cached, since repeated calls into the same module
+        are common, and importing it every time takes much longer than the
+        call itself for cheap functions. The function is still looked up on
+        every call, so that rebinding it in the module takes effect.
+        """
+        try:
+            module = self._modules[modname]
+        except KeyError:
+            # As soon as we drop support for python2.6, we should replace
+            # this with importlib.import_module:
+            module = self._modules[modname] = __import__(
+                modname, None, None, '*')
+        return getattr(module, funcname)
+
+    def _dispatch_batch(self, calls):
+        """Execute multiple requests and return all of their responses."""
+        responses = []
+        handlers = get_handlers(type(self))
+        for kind, args in calls:
+            handler = handlers[kind]
+            try:
+                data = handler(self, *args)
+                if isinstance(data, PreEncoded):
+                    data = data.decode()
+                response = ('data', (data,))
+            except Exception:
+                response = self._format_exception(sys.exc_info())
+            responses.append(response)
+        return responses
 
     def _dispatch_close(self):
         """Close the connection gracefully as initiated by the client."""
@@ -108,12 +193,19 @@ class Service(object):
 
     def _reply_data(self, data):
         """Return data to the client."""
-        self._conn.send(('data', (data,)))
+        if isinstance(data, PreEncoded):
+            self._conn.send_bytes(data.payload, data.buffers)
+        else:
+            self._conn.send(('data', (data,)))
 
     def _reply_exception(self, exc_info):
         """Return an exception state to the client."""
+        self._conn.send(self._format_exception(exc_info))
+
+    def _format_exception(self, exc_info):
+        """Create an exception response from an exception state."""
         message = "".join(traceback.format_exception(*exc_info))
-        self._conn.send(('exception', (exc_info[0], message)))
+        return ('exception', (exc_info[0], message))
 
 
 if __name__ == '__main__':
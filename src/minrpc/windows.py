@@ -53,16 +53,19 @@ class Handle(object):
         return cls(handle, own)
 
     @classmethod
-    def pipe(cls):
+    def pipe(cls, size=0):
         """
         Create a unidirectional pipe.
 
+        If ``size`` is given, it is used as suggested pipe buffer size in
+        bytes.
+
         Return a pair (recv, send) of :class:`Handle`s.
         """
         # use _winapi.CreatePipe on windows, just like subprocess.Popen
         # does when requesting PIPE streams. This is the easiest and most
         # reliable method I have tested so far:
-        recv, send = _winapi.CreatePipe(None, 0)
+        recv, send = _winapi.CreatePipe(None, size)
         return cls(_unwrap(recv)), cls(_unwrap((send)))
 
     def __int__(self):
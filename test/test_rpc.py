@@ -2,11 +2,32 @@ from __future__ import absolute_import
 
 # standard library
 import os
+import pickle
+import socket
+import subprocess
+import sys
 import tempfile
+import threading
 import unittest
 
 # tested modules
+import minrpc
 from minrpc.client import Client
+from minrpc import connection
+from minrpc.connection import Connection
+from minrpc.service import Service
+
+
+calls = []
+
+
+def record_call(*args):
+    calls.append(args)
+    return len(args)
+
+
+class PureService(Service):
+    _pure_functions = {(__name__, 'record_call')}
 
 
 class TestRPC(unittest.TestCase):
@@ -32,6 +53,177 @@ class TestRPC(unittest.TestCase):
 
     # TODO: add tests to check that other resources get closed correctly.
 
+    def test_batch(self):
+        client, proc = Client.spawn_subprocess()
+        try:
+            remote_path = client.get_module('os.path')
+            with remote_path.batch() as batch:
+                batch.join('a', 'b')
+                batch.basename('/x/y')
+            self.assertEqual(batch.results, [os.path.join('a', 'b'), 'y'])
+            # a missing function fails the same way on all python versions:
+            with self.assertRaises(AttributeError):
+                with remote_path.batch() as batch:
+                    batch.no_such_function()
+                    batch.basename('/x/y')
+        finally:
+            client.close()
+
+    def test_pipelined_requests(self):
+        client, proc = Client.spawn_subprocess(max_in_flight=4)
+        remote_path = client.get_module('os.path')
+        results = {}
+
+        def work(i):
+            results[i] = [remote_path.join(str(i), str(j)) for j in range(50)]
+
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(8)]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            client.close()
+        self.assertEqual(results, {
+            i: [os.path.join(str(i), str(j)) for j in range(50)]
+            for i in range(8)
+        })
+
+    def test_pipelined_client_without_close(self):
+        # The client must be cleaned up at exit, while its reader thread is
+        # still waiting for responses:
+        script = '\n'.join([
+            "from minrpc.client import Client",
+            "client, proc = Client.spawn_subprocess(max_in_flight=2)",
+            "client.get_module('os.path').join('a', 'b')",
+        ])
+        src_dir = os.path.dirname(os.path.dirname(minrpc.__file__))
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(
+            [src_dir] + env.get('PYTHONPATH', '').split(os.pathsep))
+        self.assertEqual(
+            subprocess.call([sys.executable, '-c', script], env=env), 0)
+
+    @unittest.skipIf(pickle.HIGHEST_PROTOCOL < 5, "requires pickle protocol 5")
+    def test_out_of_band_buffers(self):
+        local, remote = socket.socketpair()
+        conn = Connection.from_socket(local)
+        peer = Connection.from_socket(remote)
+        data = bytearray(b'abc' * 1000)
+        try:
+            conn.send(('data', (pickle.PickleBuffer(data), b'in-band')))
+            self.assertEqual(peer.recv(), ('data', (data, b'in-band')))
+        finally:
+            conn.close()
+            peer.close()
+
+    def test_pure_function_responses_are_cached(self):
+        recv_a, send_a = os.pipe()
+        recv_b, send_b = os.pipe()
+        conn = Connection.from_fd(recv_b, send_a)
+        svc = PureService(Connection.from_fd(recv_a, send_b))
+        del calls[:]
+        try:
+            for args in [(1, 2), (1, 2), (True, 2), ((1,), 2), ((True,), 2),
+                         ((True,), 2)]:
+                conn.send(('function_call', (__name__, 'record_call',
+                                             args, {})))
+                svc._communicate()
+                self.assertEqual(conn.recv(), ('data', (2,)))
+            # cached responses are also used within batches:
+            conn.send(('batch', ([('function_call', (
+                __name__, 'record_call', (1, 2), {}))],)))
+            svc._communicate()
+            self.assertEqual(conn.recv(), ('data', ([('data', (2,))],)))
+        finally:
+            conn.close()
+            svc._conn.close()
+        # equal arguments of different type are cached separately:
+        self.assertEqual(calls, [(1, 2), (True, 2), ((1,), 2), ((True,), 2)])
+
+    @unittest.skipIf(pickle.HIGHEST_PROTOCOL < 5, "requires pickle protocol 5")
+    def test_large_messages_over_pipes(self):
+        recv_a, send_a = os.pipe()
+        recv_b, send_b = os.pipe()
+        conn = Connection.from_fd(recv_b, send_a)
+        peer = Connection.from_fd(recv_a, send_b)
+        messages = [
+            ('data', (b'x' * (4 << 20),)),
+            ('data', ([pickle.PickleBuffer(bytearray(b'%d' % i))
+                       for i in range(3000)],)),
+        ]
+        expected = [
+            messages[0],
+            ('data', ([bytearray(b'%d' % i) for i in range(3000)],)),
+        ]
+        received = []
+        # Limit the size of each writev call to exercise resuming partial
+        # writes, and check that no call passes more than IOV_MAX buffers:
+        writev = getattr(os, 'writev', None)
+        iov_counts = []
+
+        def partial_writev(fd, buffers):
+            iov_counts.append(len(buffers))
+            return writev(fd, buffers[:-1] + [buffers[-1][:10000]])
+
+        def receive():
+            for _ in messages:
+                received.append(peer.recv())
+        thread = threading.Thread(target=receive)
+        thread.start()
+        if writev:
+            connection.os.writev = partial_writev
+        try:
+            for message in messages:
+                conn.send(message)
+        finally:
+            if writev:
+                connection.os.writev = writev
+            thread.join()
+            conn.close()
+            peer.close()
+        self.assertEqual(received, expected)
+        if writev:
+            self.assertTrue(len(iov_counts) > len(messages))
+            self.assertTrue(max(iov_counts) <= 1024)
+
+    def test_truncated_message_raises_eof(self):
+        class Stream(object):
+            # file without readinto, returns at most 3 bytes per read:
+            def __init__(self, data):
+                self.data = data
+
+            def read(self, size):
+                part = self.data[:min(size, 3)]
+                self.data = self.data[len(part):]
+                return part
+        self.assertEqual(
+            bytes(connection.read(Stream(b'abcdefgh'), 8)), b'abcdefgh')
+        self.assertRaises(EOFError, connection.read, Stream(b'abcd'), 8)
+
+    def test_tcp_connection_disables_nagle(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+        client = socket.create_connection(server.getsockname())
+        remote, _ = server.accept()
+        server.close()
+        # the duplicate shares the socket options with the original:
+        probe = client.dup()
+        conn = Connection.from_socket(client)
+        self.assertTrue(probe.getsockopt(
+            socket.IPPROTO_TCP, socket.TCP_NODELAY))
+        probe.close()
+        peer = Connection.from_socket(remote)
+        try:
+            conn.send(('data', (b'x' * 100000,)))
+            self.assertEqual(peer.recv(), ('data', (b'x' * 100000,)))
+        finally:
+            conn.close()
+            peer.close()
+        self.assertTrue(conn.closed)
+
 
 if __name__ == '__main__':
     unittest.main()